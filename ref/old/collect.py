@@ -1,12 +1,29 @@
 '''
 
 '''
-import time
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from computer import ComputerController
 from dotenv import load_dotenv
 
-def main():
+async def screenshot_loop(controller, executor, interval):
+    """Grab a frame into the controller every interval seconds."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await loop.run_in_executor(executor, controller.capture_latest)
+        
+        # Sleep off the rest of the interval so the grabs don't drift
+        await asyncio.sleep(max(0, interval - (loop.time() - started)))
+
+async def report_clicks(clicks):
+    """Print clicks as the controller reports them."""
+    while True:
+        x, y = await clicks.get()
+        print(f"Click recorded at coordinates: {x}, {y}")
+
+async def main():
     """Track and save mouse coordinates to JSON when left button is clicked and take screenshots."""
     # Load environment variables
     load_dotenv()
@@ -14,35 +31,27 @@ def main():
     # Get monitor ID from environment variable (default to 2 if not set)
     monitor_id = int(os.getenv("MONITOR_ID", 2))
     
-    # Initialize the computer controller with the output file and screenshot settings
-    controller = ComputerController(
+    # Clicks arrive on pynput's listener thread; hand them to the event loop
+    loop = asyncio.get_running_loop()
+    clicks = asyncio.Queue()
+    
+    # Initialize the computer controller with the output file and screenshot settings.
+    # The executor keeps every grab on one thread, off the event loop; on exit it
+    # is shut down first, then the controller stops the listener and drains pending clicks
+    with ComputerController(
         output_dir="data/text",
         screenshot_dir="data/images",
-        screenshot_interval=0.5,  # 2 screenshots per second
-        monitor_id=monitor_id
-    )
-    
-    print("Tracking mouse clicks and taking screenshots. Press Ctrl+C to exit.")
+        monitor_id=monitor_id,
+        on_click=lambda x, y: loop.call_soon_threadsafe(clicks.put_nowait, (x, y))
+    ) as controller, ThreadPoolExecutor(max_workers=1) as executor:
+        print("Tracking mouse clicks and taking screenshots. Press Ctrl+C to exit.")
+        await asyncio.gather(
+            screenshot_loop(controller, executor, interval=0.5),  # 2 screen grabs per second
+            report_clicks(clicks)
+        )
+
+if __name__ == "__main__":
     try:
-        while True:
-            current_time = time.time()
-            
-            # Check if it's time to take a screenshot
-            if controller.should_take_screenshot(current_time):
-                screenshot_path = controller.take_screenshot()
-                if screenshot_path:
-                    controller.update_screenshot_time(current_time)
-            
-            # Check if the mouse was clicked
-            if controller.was_clicked():
-                # Get current mouse position
-                x, y = controller.get_mouse_position()
-                print(f"Click recorded at coordinates: {x}, {y}")
-            
-            # Small delay to prevent high CPU usage
-            time.sleep(0.01)
+        asyncio.run(main())
     except KeyboardInterrupt:
         print("\nMouse tracking and screenshot capture stopped.")
-
-if __name__ == "__main__":
-    main()
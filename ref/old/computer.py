@@ -2,49 +2,135 @@
 
 '''
 from pynput.mouse import Controller, Listener
+import fcntl
+import io
 import os
 import json
+import queue
 import subprocess
+import threading
 import zlib
-from datetime import datetime
 from mss.darwin import MSS as mss
 from PIL import Image
 import time
 
+try:
+    # Optional: libjpeg-turbo bindings for faster JPEG encoding
+    import numpy as np
+    from turbojpeg import TurboJPEG, TJPF_BGRX
+except ImportError:
+    TurboJPEG = None
+
+try:
+    # Optional: faster JSON serialization for click examples
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class ComputerController:
     """Simple controller for mouse tracking and screenshot capture."""
     
-    def __init__(self, output_dir, screenshot_dir, screenshot_interval, monitor_id):
+    def __init__(self, output_dir, screenshot_dir, monitor_id, on_click=None):
         """Initialize the mouse controller.
         
+        No resources are opened and nothing is tracked until the controller
+        is entered as a context manager. Frames are only grabbed when
+        capture_latest() is called; the caller decides how often.
+        
         Args:
             output_dir (str): Directory where click data will be saved
             screenshot_dir (str): Directory where screenshots will be saved
-            screenshot_interval (float): Interval between screenshots in seconds
             monitor_id (int): ID of the monitor to capture screenshots from
+            on_click (callable): Optional on_click(x, y) called from the listener thread for left clicks
         """
         self.mouse = Controller()
-        self.clicked = False
         
-        # Initialize MSS for screenshots
-        self.sct = mss()
+        # MSS and the JSONL file are opened in __enter__
+        self.sct = None
+        self._monitor = None
+        self._jsonl = None
         # Compression level (0-9, where 9 is maximum compression)
         self.compression_level = 9
         
         self.output_dir = output_dir
         self.screenshot_dir = screenshot_dir
-        self.screenshot_interval = screenshot_interval
-        self.last_screenshot_time = 0
         self.monitor_id = monitor_id
+        self.on_click = on_click
         
         # Create directories if they don't exist
         os.makedirs(self.output_dir, exist_ok=True)
         os.makedirs(self.screenshot_dir, exist_ok=True)
         
-        # Set up the mouse listener
+        # Only the screenshot and the answer change between examples, so the
+        # rest of the example is built once and those two fields are filled in
+        # under a lock, so concurrent callers can't mix up their records
+        self._example_lock = threading.Lock()
+        self._image_url = {"url": None}
+        self._answer = {"role": "assistant", "content": None}
+        self._example = {
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": "Where to click? Answer with coordinates only (e.g., 1111.1111,2222.2222)"
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": self._image_url
+                        }
+                    ]
+                },
+                self._answer
+            ]
+        }
+        
+        # The most recent grab as (raw, size); only encoded if a click uses it
+        self._latest = None
+        self._latest_lock = threading.Lock()
+        
+        # Clicks are queued for a worker thread that encodes and writes the
+        # matching screenshot, so the listener thread is never held up
+        self._jobs = queue.Queue()
+        # Full-size RGB image reused by the worker thread for every Pillow-encoded frame
+        self._frame = None
+        # Encode with libjpeg-turbo when PyTurboJPEG is installed
+        self._tj = None
+        if TurboJPEG is not None:
+            try:
+                self._tj = TurboJPEG()
+            except Exception as e:
+                print(f"TurboJPEG unavailable, falling back to Pillow: {e}")
+        self._encoder = threading.Thread(target=self._encoder_loop, daemon=True)
+        
+        # Set up the mouse listener; started in __enter__
         self.listener = Listener(on_click=self._on_click)
+    
+    def __enter__(self):
+        """Open MSS and the click data file, then start the worker thread and the mouse listener."""
+        try:
+            # Initialize MSS for screenshots
+            self.sct = mss()
+            # Look the monitor up once; on darwin sct.monitors enumerates displays
+            self._monitor = self.sct.monitors[self.monitor_id]
+            
+            # All click examples are appended to a single JSONL file, kept open
+            # for the controller's lifetime instead of reopened per click
+            self._jsonl = open(os.path.join(self.output_dir, "examples.jsonl"), "ab")
+        except BaseException:
+            # e.g. an unknown monitor ID; don't leak what was already opened
+            self.close()
+            raise
+        
+        self._encoder.start()
         self.listener.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stop tracking and release all resources, see close()."""
+        self.close()
     
     def get_mouse_position(self):
         """Get the current mouse position.
@@ -65,118 +151,157 @@ class ComputerController:
         """
         # Check if it's the left button and it was pressed
         if button.name == 'left' and pressed:
-            self.clicked = True
+            if self.on_click is not None:
+                self.on_click(x, y)
             
-            # Rename the latest screenshot with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
-            new_screenshot_path = os.path.join(self.screenshot_dir, f"screenshot_{timestamp}.jpg")
+            # Pair the click with the latest frame; the worker thread encodes
+            # and writes it under a name matching the click
+            with self._latest_lock:
+                frame = self._latest
+            self._jobs.put((x, y, time.time_ns() // 1_000_000, frame))
+    
+    def save_click_data(self, x, y, screenshot_path=None):
+        """Append a click as a training example to the JSONL file.
+        
+        Args:
+            x (int): X coordinate of the click
+            y (int): Y coordinate of the click
+            screenshot_path (str): Path to the matching screenshot, or None if there is none
+        """
+        with self._example_lock:
+            self._image_url["url"] = screenshot_path
+            self._answer["content"] = f"{x},{y}"
             
-            # Try to rename the generic screenshot file if it exists
-            generic_screenshot_path = os.path.join(self.screenshot_dir, "screenshot.jpg")
-            if os.path.exists(generic_screenshot_path):
-                try:
-                    os.rename(generic_screenshot_path, new_screenshot_path)
-                    # Save the click with the new screenshot path
-                    self.save_click_data(x, y, new_screenshot_path)
-                except OSError as e:
-                    print(f"Error renaming screenshot: {e}")
-                    # If renaming fails, save click with the generic path
-                    self.save_click_data(x, y, generic_screenshot_path)
+            # One compact JSON object per line
+            if orjson is not None:
+                line = orjson.dumps(self._example)
             else:
-                # If no screenshot exists, just save the click
-                self.save_click_data(x, y)
+                line = json.dumps(self._example, separators=(",", ":")).encode()
+            self._jsonl.write(line + b"\n")
+            # Flush every record so a crash doesn't lose clicks whose screenshots are on disk
+            self._jsonl.flush()
     
-    def save_click_data(self, x, y, screenshot_path):
-        example = {
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Where to click? Answer with coordinates only (e.g., 1111.1111,2222.2222)"
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": screenshot_path
-                            }
-                        }
-                    ]
-                },
-                {
-                    "role": "assistant",
-                    "content": f"{x},{y}"
-                }
-            ]
-        }
+    def capture_latest(self):
+        """Grab the specified monitor using MSS and keep it in memory as the latest frame."""
+        try:
+            # The MSS instance is kept open for the controller's lifetime
+            # instead of re-entered per frame
+            sct_img = self.sct.grab(self._monitor)
+        except Exception as e:
+            print(f"Error taking screenshot: {e}")
+            return
         
-        timestamp = int(time.time() * 1000)
-        output_file = os.path.join(self.output_dir, f"example_{timestamp}.json")
-        with open(output_file, "w") as f:
-            json.dump(example, f, indent=2)
+        with self._latest_lock:
+            self._latest = (sct_img.raw, sct_img.size)
     
-    def was_clicked(self):
-        """Check if the left mouse button was clicked.
+    def _save_screenshot(self, raw, size, screenshot_path):
+        """Save a raw BGRA frame as a compressed JPEG.
         
-        Returns:
-            bool: True if the left button was clicked since the last check
-        """
-        if self.clicked:
-            self.clicked = False
-            return True
-        return False
-    
-    def take_screenshot(self):
-        """Take a screenshot of the specified monitor using MSS and save it as a compressed JPEG.
+        Args:
+            raw (bytearray): Raw BGRA pixels as grabbed by MSS
+            size (tuple): (width, height) of the frame
+            screenshot_path (str): Path where the screenshot will be saved
         
         Returns:
             str: Path to the saved screenshot, or None if failed
         """
         try:
-            # Save with a generic name - will be renamed on click
-            screenshot_path = os.path.join(self.screenshot_dir, "screenshot.png")
-            
-            # Use MSS to capture the screen
-            with self.sct as sct:
-                # Capture the specified monitor
-                sct_img = sct.grab(sct.monitors[self.monitor_id])
+            if self._tj is not None:
+                # libjpeg-turbo reads BGRA pixels directly, so skip the colour
+                # conversion: wrap the raw buffer without copying (labelled
+                # RGBX only so Pillow can box-filter it, which doesn't care
+                # about channel order) and pass the result on as an ndarray
+                img = Image.frombuffer("RGBX", size, raw, "raw", "RGBX", 0, 1).reduce(2)
+                jpeg_bytes = self._tj.encode(np.asarray(img), quality=30, pixel_format=TJPF_BGRX)
+            else:
+                # Only allocate the full-size image again if the resolution changed
+                if self._frame is None or self._frame.size != size:
+                    self._frame = Image.new("RGB", size)
                 
-                # Convert to PIL Image
-                img = Image.frombytes("RGB", (sct_img.width, sct_img.height), sct_img.rgb)
+                # Decode the raw BGRA buffer into the pooled image; the "BGRX"
+                # raw decoder reorders channels in C, so we skip the
+                # Python-level BGRA->RGB conversion behind sct_img.rgb
+                self._frame.frombytes(raw, "raw", "BGRX", 0, 1)
                 
-                # Resize to reduce quality (optional)
-                # Reduce the image size by 50%
-                new_width = sct_img.width // 2
-                new_height = sct_img.height // 2
-                img = img.resize((new_width, new_height), Image.LANCZOS)
+                # Reduce the image size by 50%; a 2x2 box filter is plenty
+                # for a JPEG saved at quality 30 and much cheaper than LANCZOS
+                img = self._frame.reduce(2)
                 
                 # Save as JPEG with low quality for maximum compression
-                # Change extension to .jpg
-                screenshot_path = os.path.join(self.screenshot_dir, "screenshot.jpg")
-                img.save(screenshot_path, format="JPEG", quality=30, optimize=True)
-                
+                buf = io.BytesIO()
+                img.save(buf, format="JPEG", quality=30)
+                jpeg_bytes = buf.getbuffer()
+            self._write_file(screenshot_path, jpeg_bytes)
+            
             return screenshot_path
         except Exception as e:
-            print(f"Error taking screenshot: {e}")
+            print(f"Error saving screenshot: {e}")
             return None
     
-    def should_take_screenshot(self, current_time):
-        """Check if it's time to take a screenshot based on the interval.
+    def _encoder_loop(self):
+        """Save queued clicks and their screenshots until a None job is received."""
+        # Last frame written and its path; clicks between two grabs share it
+        last_frame, last_path = None, None
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            
+            x, y, timestamp, frame = job
+            # A failing job must not take the worker down with it, or later
+            # clicks (and their frames) pile up in the queue
+            try:
+                if frame is None:
+                    # If no screenshot is available, just save the click
+                    self.save_click_data(x, y)
+                    continue
+                
+                # Only encode a frame once, e.g. for both clicks of a double-click
+                if frame is not last_frame:
+                    screenshot_path = os.path.join(self.screenshot_dir, f"screenshot_{timestamp}.jpg")
+                    last_frame = frame
+                    last_path = self._save_screenshot(*frame, screenshot_path)
+                self.save_click_data(x, y, last_path)
+            except Exception as e:
+                print(f"Error saving click: {e}")
+    
+    @staticmethod
+    def _write_file(path, data):
+        """Write a whole file with as few syscalls as possible.
         
         Args:
-            current_time (float): Current time in seconds
-            
-        Returns:
-            bool: True if it's time to take a screenshot
+            path (str): Path of the file to (over)write
+            data (bytes): File contents
         """
-        return current_time - self.last_screenshot_time >= self.screenshot_interval
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            # Screenshots are write-once, so keep them out of the page cache
+            if hasattr(fcntl, "F_NOCACHE"):
+                fcntl.fcntl(fd, fcntl.F_NOCACHE, 1)
+            
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+        finally:
+            os.close(fd)
     
-    def update_screenshot_time(self, current_time):
-        """Update the last screenshot time.
+    def close(self):
+        """Stop tracking, finish pending clicks and flush the click data.
         
-        Args:
-            current_time (float): Current time in seconds
+        Safe to call on a controller that was never entered, or more than once.
         """
-        self.last_screenshot_time = current_time
-    
\ No newline at end of file
+        # Only threads that were started can be stopped and joined
+        if self.listener.is_alive():
+            self.listener.stop()
+            self.listener.join()
+        if self._encoder.is_alive():
+            self._jobs.put(None)
+            self._encoder.join()
+        
+        if self.sct is not None:
+            self.sct.close()
+            self.sct = None
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._jsonl = None